@@ -1,23 +1,57 @@
+import asyncio
+import csv
+import gzip
 import logging
 import os
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import Callable, List, Dict, Optional, Any, Set, TextIO, Tuple, TypeVar
 
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser, LexborNode
 from tqdm import tqdm
 from datetime import datetime
 
 # Constants
 CACHE_DIR = Path("cache")
 CSV_FILE = Path("scrape.csv")
+SEEN_FILE = Path("scrape.seen")
 HEADERS_FILE = Path("headers.txt")
 BASE_URL = "https://www.withroam.com"
 STATE_URL = f"{BASE_URL}/state/GA?page={{}}"
 CITY_URL = f"{BASE_URL}/cities/34526/Gainesville-GA?page={{}}"
+REQUEST_TIMEOUT = 15
+MAX_CONCURRENCY = 64
+CSV_BATCH_SIZE = 16
+GZIP_MAGIC = b'\x1f\x8b'
+
+# CSS selectors used per listing
+SEL_TITLE = 'title'
+SEL_TITLE_META = 'meta[name="description"]'
+SEL_CANONICAL = 'link[rel="canonical"]'
+SEL_OG_IMAGE = 'meta[property="og:image"]'
+SEL_H1_ADDR = 'h1.fs-14.text-body-secondary.fw-bold'
+SEL_DESC_P = 'p.fs-6.pb-1.text-body'
+SEL_DFLEX = '#calculator-section .d-flex'
+SEL_DESCRIPTION = 'p.description'
+
+# Precompiled patterns used per listing
+BED_RE = re.compile(r'(\d+)\s*beds?')
+BATH_RE = re.compile(r'(\d+)\s*baths?')
+SQFT_RE = re.compile(r'([\d,]+)\s*sqft')
+DOCK_RE = re.compile(r'dock', re.I)
+COMMUNITY_DOCK_RE = re.compile(r'community dock', re.I)
+LANIER_RE = re.compile(r'lanier', re.I)
+LISTING_HREF_RE = re.compile(rb'href="(/listing/[^"]+)"')
+MAX_PAGE_RE = re.compile(rb'href="[^"]*?[?&]page=(\d+)[^"]*"[^>]*>\s*\.\.\.\s*</a>')
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 # Logging configuration
 logging.basicConfig(
@@ -25,6 +59,14 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+# Shared HTTP session so every request to BASE_URL reuses pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_CONCURRENCY,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+))
+
 def load_headers(headers_file: Path = HEADERS_FILE) -> Dict[str, str]:
     """Load HTTP headers from a file."""
     headers = {}
@@ -38,59 +80,50 @@ def load_headers(headers_file: Path = HEADERS_FILE) -> Dict[str, str]:
         logging.warning(f"{headers_file} not found. Proceeding without custom headers.")
     return headers
 
-def fetch_html(url: str, headers: Optional[Dict[str, str]] = None) -> str:
-    """Fetch HTML content from a URL."""
-    response = requests.get(url, headers=headers)
+def fetch_bytes(url: str) -> bytes:
+    """Fetch the raw, undecoded body of a URL using the shared session."""
+    response = _SESSION.get(url, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
-    return response.text
-
-def find_multiline_ellipsis_links(html: str) -> List[str]:
-    """Find all <a> tags with '...' as their text."""
-    soup = BeautifulSoup(html, 'html.parser')
-    return [str(a) for a in soup.find_all('a') if a.get_text(strip=True) == '...']
-
-def get_maxpageid(html: str) -> int:
-    """Extract the maximum page ID from HTML."""
-    for line in find_multiline_ellipsis_links(html):
-        try:
-            val = int(line.split('page=')[1].split('"')[0].split('&')[0])
-            return val
-        except (IndexError, ValueError):
-            continue
+    return response.content
+
+def get_maxpageid(html: bytes) -> int:
+    """Extract the maximum page ID from the '...' pagination link in raw HTML."""
+    match = MAX_PAGE_RE.search(html)
+    if match:
+        return int(match.group(1))
     raise ValueError("Could not determine max page id.")
 
-def find_listing_links(html: str) -> List[str]:
-    """Extract all listing links from HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
-    return [a['href'] for a in soup.find_all('a', href=True) if a['href'].startswith('/listing/')]
-
-def parse_listing_html(html: str) -> Dict[str, Any]:
-    """Parse main listing details from HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
-    title = soup.title.string.strip() if soup.title else None
-    meta_description = soup.find('meta', attrs={'name': 'description'})
-    description = meta_description['content'].strip() if meta_description else None
-    canonical_link = soup.find('link', rel='canonical')
-    canonical_url = canonical_link['href'] if canonical_link else None
-    og_image = soup.find('meta', property='og:image')
-    image_url = og_image['content'].strip() if og_image else None
+def find_listing_links(html: bytes) -> List[str]:
+    """Extract unique listing links, in page order, from raw HTML."""
+    return [link.decode() for link in dict.fromkeys(LISTING_HREF_RE.findall(html))]
+
+def parse_listing_html(tree: LexborHTMLParser) -> Dict[str, Any]:
+    """Parse main listing details from a parsed HTML tree."""
+    title_tag = tree.css_first(SEL_TITLE)
+    title = title_tag.text(strip=True) if title_tag else None
+    meta_description = tree.css_first(SEL_TITLE_META)
+    description = meta_description.attributes['content'].strip() if meta_description else None
+    canonical_link = tree.css_first(SEL_CANONICAL)
+    canonical_url = canonical_link.attributes['href'] if canonical_link else None
+    og_image = tree.css_first(SEL_OG_IMAGE)
+    image_url = og_image.attributes['content'].strip() if og_image else None
 
     # Address extraction
     address = None
-    h1_address = soup.find('h1', class_='fs-14 text-body-secondary fw-bold')
+    h1_address = tree.css_first(SEL_H1_ADDR)
     if h1_address:
-        address = h1_address.get_text(strip=True)
+        address = h1_address.text(strip=True)
     elif canonical_url:
         address = canonical_url.split('/')[-1].replace('-', ' ').upper()
 
     # Bed, bath, sqft extraction
     bed = bath = sqft = None
-    desc_p = soup.find('p', class_='fs-6 pb-1 text-body')
+    desc_p = tree.css_first(SEL_DESC_P)
     if desc_p:
-        desc_text = desc_p.get_text(strip=True)
-        bed_match = re.search(r'(\d+)\s*beds?', desc_text)
-        bath_match = re.search(r'(\d+)\s*baths?', desc_text)
-        sqft_match = re.search(r'([\d,]+)\s*sqft', desc_text)
+        desc_text = desc_p.text(strip=True)
+        bed_match = BED_RE.search(desc_text)
+        bath_match = BATH_RE.search(desc_text)
+        sqft_match = SQFT_RE.search(desc_text)
         bed = int(bed_match.group(1)) if bed_match else None
         bath = int(bath_match.group(1)) if bath_match else None
         sqft = int(sqft_match.group(1).replace(',', '')) if sqft_match else None
@@ -121,130 +154,235 @@ def parse_listing_html(html: str) -> Dict[str, Any]:
         'canonical_url': canonical_url
     }
 
-def parse_details(html: str, class_: str = 'loan-feature') -> Dict[str, Any]:
-    """Parse details from a given class in HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
-    details = []
-    for feature in soup.find_all('div', class_=class_):
-        detail = [div.get_text(strip=True) for div in feature.find_all('div')]
-        if detail:
-            details.append(detail)
-    return details_list_to_dict(details)
-
-def details_list_to_dict(details: List[List[str]]) -> Dict[str, Any]:
-    """Convert a list of details into a dictionary."""
+def parse_listing_html_from_str(html: str) -> Dict[str, Any]:
+    """Parse main listing details from raw HTML."""
+    return parse_listing_html(LexborHTMLParser(html))
+
+def parse_details(tree: LexborHTMLParser, class_: str = 'loan-feature') -> Dict[str, Any]:
+    """Parse details from a given class in a parsed HTML tree."""
+    return details_to_dict(tree.css(f'div.{class_}'))
+
+def details_to_dict(containers: List[LexborNode]) -> Dict[str, Any]:
+    """Map each container's first descendant <div> text to the text of its remaining descendant <div>s."""
     result = {}
-    for detail in details:
-        if len(detail) > 1:
-            result[detail[0]] = detail[1] if len(detail) == 2 else detail[1:]
-        elif detail:
-            result[detail[0]] = None
+    for container in containers:
+        # Lexbor's css() also matches the container itself when it is a <div>
+        divs = (div for div in container.css('div') if div.mem_id != container.mem_id)
+        key_div = next(divs, None)
+        if key_div is None:
+            continue
+        values = [div.text(strip=True) for div in divs]
+        result[key_div.text(strip=True)] = values[0] if len(values) == 1 else (values or None)
     return result
 
-def get_financials(html: str) -> Dict[str, Any]:
-    """Extract financial details from HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
-    section = soup.find(id='calculator-section')
-    details = []
-    if section:
-        for d_flex in section.find_all(class_='d-flex'):
-            detail = [div.get_text(strip=True) for div in d_flex.find_all('div')]
-            details.append(detail)
-    return details_list_to_dict(details)
-
-def get_description(html: str) -> Optional[str]:
-    """Extract the property description from HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
-    desc = soup.find('p', class_='description')
-    return desc.get_text(strip=True) if desc else None
-
-def contains_str(text: Optional[str], substring: str) -> bool:
-    """Check if substring is in text (case-insensitive)."""
-    return substring.lower() in text.lower() if text else False
-
-def load_existing_dataframe(csv_file: Path) -> pd.DataFrame:
-    """Load existing DataFrame from CSV if it exists."""
-    if csv_file.exists():
-        logging.info(f"Loaded existing {csv_file}")
-        return pd.read_csv(csv_file)
-    return pd.DataFrame()
-
-def cache_html(filename: Path, html: str) -> None:
-    """Cache HTML content to a file."""
-    filename.parent.mkdir(parents=True, exist_ok=True)
-    filename.write_text(html, encoding='utf-8')
-
-def get_cached_html(filename: Path) -> Optional[str]:
-    """Retrieve cached HTML if it exists."""
-    if filename.exists():
-        return filename.read_text(encoding='utf-8')
+def get_financials(tree: LexborHTMLParser) -> Dict[str, Any]:
+    """Extract financial details from a parsed HTML tree."""
+    return details_to_dict(tree.css(SEL_DFLEX))
+
+def get_description(tree: LexborHTMLParser) -> Optional[str]:
+    """Extract the property description from a parsed HTML tree."""
+    desc = tree.css_first(SEL_DESCRIPTION)
+    return desc.text(strip=True) if desc else None
+
+def contains_str(text: Optional[str], pattern: re.Pattern) -> bool:
+    """Check if a precompiled (case-insensitive) pattern occurs in text."""
+    return text is not None and pattern.search(text) is not None
+
+def load_seen_urls(seen_file: Path = SEEN_FILE, csv_file: Path = CSV_FILE) -> Set[str]:
+    """Load already processed listing URLs, seeding the sidecar file from the CSV on first run."""
+    # The sidecar only describes rows in the CSV; without them, start over
+    if not csv_file.exists() or csv_file.stat().st_size == 0:
+        if seen_file.exists():
+            logging.info(f"{csv_file} is missing or empty, resetting {seen_file}")
+        seen_file.write_text('', encoding='utf-8')
+        return set()
+    if seen_file.exists():
+        logging.info(f"Loaded existing {seen_file}")
+        return set(seen_file.read_text(encoding='utf-8').splitlines())
+    logging.info(f"Seeding {seen_file} from existing {csv_file}")
+    seen = set(pd.read_csv(csv_file, usecols=['url'])['url'].dropna().astype(str))
+    seen_file.write_text(''.join(f"{url}\n" for url in seen), encoding='utf-8')
+    return seen
+
+def write_batch(csv_f: TextIO, seen_f: TextIO, batch: List[Tuple[str, Tuple[Any, ...]]]) -> None:
+    """Append parsed records to the CSV, then record their URLs in the seen file."""
+    csv.writer(csv_f, lineterminator='\n').writerows(record for _, record in batch)
+    csv_f.flush()
+    seen_f.writelines(f"{home_url}\n" for home_url, _ in batch)
+    seen_f.flush()
+
+def cache_html(filename: Path, html: bytes) -> None:
+    """Cache HTML content to a gzip-compressed file (CACHE_DIR must already exist)."""
+    tmp_file = filename.with_name(filename.name + '.tmp')
+    with gzip.open(tmp_file, 'wb', compresslevel=6) as f:
+        f.write(html)
+    os.replace(tmp_file, filename)
+
+def has_cached_html(filename: Path) -> bool:
+    """Check for a gzip cache file or its uncompressed legacy .html sibling."""
+    return filename.exists() or filename.with_suffix('').exists()
+
+def read_cache_file(filename: Path) -> Optional[bytes]:
+    """Read a cache file as stored (gzip or uncompressed legacy .html), without decompressing it."""
+    for path in (filename, filename.with_suffix('')):
+        if path.exists():
+            return path.read_bytes()
     return None
 
-def main():
+def decompress_cached_html(data: bytes) -> bytes:
+    """Return HTML bytes from cache file contents, gunzipping them if needed."""
+    return gzip.decompress(data) if data[:2] == GZIP_MAGIC else data
+
+def get_cached_html(filename: Path) -> Optional[bytes]:
+    """Retrieve cached HTML bytes if they exist, falling back to an uncompressed legacy .html file."""
+    data = read_cache_file(filename)
+    return decompress_cached_html(data) if data is not None else None
+
+def listing_cache_file(home_url: str) -> Path:
+    """Return the cache file path for a listing URL."""
+    return CACHE_DIR / f"{home_url.split('/')[-1]}.html.gz"
+
+def download_listing(home_url: str) -> None:
+    """Fetch a listing page and write it to the cache."""
+    logging.info(f"Fetching data for home: {home_url}")
+    cache_html(listing_cache_file(home_url), fetch_bytes(home_url))
+
+def parse_one(data: bytes) -> Tuple[Any, ...]:
+    """Parse the contents of a listing cache file into a CSV record."""
+    tree = LexborHTMLParser(decompress_cached_html(data))
+    listing_data = parse_listing_html(tree)
+    details = {cls: parse_details(tree, class_=cls) for cls in ['loan-feature', 'home-feature']}
+    financials = get_financials(tree)
+    description = get_description(tree)
+    contains_dock = contains_str(description, DOCK_RE)
+    contains_communitydock = contains_str(description, COMMUNITY_DOCK_RE)
+    contains_lanier = contains_str(description, LANIER_RE)
+
+    return (
+        contains_dock,
+        contains_communitydock,
+        contains_lanier,
+        listing_data['city'],
+        listing_data['canonical_url'],
+        listing_data['address'],
+        listing_data['bedrooms'],
+        listing_data['bathrooms'],
+        listing_data['sqft'],
+        financials.get('Listing price'),
+        financials.get('Your cash down payment'),
+        details['loan-feature'].get('Loan Type'),
+        details['loan-feature'].get('Rate'),
+        details['loan-feature'].get('Remaining balance'),
+        details['home-feature'].get('Total')
+    )
+
+async def gather_bounded(func: Callable[[T], R], items: List[T], desc: str) -> List[R]:
+    """Run func over items in worker threads, at most MAX_CONCURRENCY at a time, preserving order."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    progress = tqdm(total=len(items), desc=desc)
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            result = await asyncio.to_thread(func, item)
+        progress.update()
+        return result
+
+    try:
+        return await asyncio.gather(*(run(item) for item in items))
+    finally:
+        progress.close()
+
+async def parse_cached_listings(home_urls: List[str], csv_f: TextIO, seen_f: TextIO) -> None:
+    """Read cache files on threads and parse them on worker processes, overlapping disk I/O with parsing."""
+    workers = os.cpu_count() or 1
+    queue = asyncio.Queue(maxsize=MAX_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    batch = []
+    progress = tqdm(total=len(home_urls), desc="Parsing home data")
+
+    async def produce() -> None:
+        for home_url in home_urls:
+            data = await asyncio.to_thread(read_cache_file, listing_cache_file(home_url))
+            if data is None:
+                logging.warning(f"No cached HTML for {home_url}, skipping")
+                progress.update()
+                continue
+            await queue.put((home_url, data))
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume(executor: ProcessPoolExecutor) -> None:
+        while (item := await queue.get()) is not None:
+            home_url, data = item
+            record = await loop.run_in_executor(executor, parse_one, data)
+            batch.append((home_url, record))
+            if len(batch) >= CSV_BATCH_SIZE:
+                write_batch(csv_f, seen_f, batch)
+                batch.clear()
+            progress.update()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            tasks = [asyncio.create_task(produce())]
+            tasks += [asyncio.create_task(consume(executor)) for _ in range(workers)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Don't leave the producer blocked on a full queue
+                for task in tasks:
+                    task.cancel()
+                raise
+        write_batch(csv_f, seen_f, batch)
+    finally:
+        progress.close()
+
+async def main():
     city = None  # Set to "Gainesville" for city-specific scraping
-    headers = load_headers()
+    _SESSION.headers.update(load_headers())
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # asyncio.to_thread() runs on the default executor, size it to match the connection pool
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENCY))
     url = CITY_URL.format(1) if city == "Gainesville" else STATE_URL.format(1)
-    html = fetch_html(url, headers)
+    html = await asyncio.to_thread(fetch_bytes, url)
     maxpageid = get_maxpageid(html)
     logging.info(f"Max page ID: {maxpageid}")
 
-    # Gather all listing links
-    listing_links = []
-    for i in tqdm(range(1, maxpageid + 1), desc="Fetching listing links"):
-        page_url = CITY_URL.format(i) if city == "Gainesville" else STATE_URL.format(i)
-        html = fetch_html(page_url, headers)
-        listing_links.extend(find_listing_links(html))
+    # Gather all listing links, reusing the already fetched first page
+    page_urls = [
+        CITY_URL.format(i) if city == "Gainesville" else STATE_URL.format(i)
+        for i in range(2, maxpageid + 1)
+    ]
+    page_links = await gather_bounded(
+        lambda page_url: find_listing_links(fetch_bytes(page_url)), page_urls, desc="Fetching listing links"
+    )
+    listing_links = find_listing_links(html) + [link for links in page_links for link in links]
 
-    # Prepare DataFrame
+    # Prepare CSV output
     columns = [
         "contains_dock", "contains_communitydock", "contains_lanier", "city", "url", "address", "bedrooms", "bathrooms", "sqft",
         "listing_price", "cash_down_payment", "loan_type", "rate", "remaining_balance", "monthly_payment"
     ]
-    df = load_existing_dataframe(CSV_FILE)
+    seen = load_seen_urls()
 
-    for link in tqdm(listing_links, desc="Fetching home data"):
+    home_urls = []
+    for link in listing_links:
         home_url = f"{BASE_URL}{link}"
-        if 'url' in df.columns and home_url in df['url'].values:
+        if home_url in seen:
             logging.info(f"Skipping already processed link: {link}")
             continue
+        seen.add(home_url)
+        home_urls.append(home_url)
+
+    # Download every listing that is not cached yet
+    uncached = [home_url for home_url in home_urls if not has_cached_html(listing_cache_file(home_url))]
+    await gather_bounded(download_listing, uncached, desc="Fetching home data")
 
-        cache_file = CACHE_DIR / f"{home_url.split('/')[-1]}.html"
-        html = get_cached_html(cache_file)
-        if not html:
-            logging.info(f"Fetching data for home: {home_url}")
-            html = fetch_html(home_url, headers)
-            cache_html(cache_file, html)
-        else:
-            logging.info(f"Using cached file: {cache_file}")
-
-        listing_data = parse_listing_html(html)
-        details = {cls: parse_details(html, class_=cls) for cls in ['loan-feature', 'home-feature']}
-        financials = get_financials(html)
-        description = get_description(html)
-        contains_dock = contains_str(description, 'dock')
-        contains_communitydock = contains_str(description, 'community dock')
-        contains_lanier = contains_str(description, 'lanier')
-
-        record = [
-            contains_dock,
-            contains_communitydock,
-            contains_lanier,
-            listing_data['city'],
-            listing_data['canonical_url'],
-            listing_data['address'],
-            listing_data['bedrooms'],
-            listing_data['bathrooms'],
-            listing_data['sqft'],
-            financials.get('Listing price'),
-            financials.get('Your cash down payment'),
-            details['loan-feature'].get('Loan Type'),
-            details['loan-feature'].get('Rate'),
-            details['loan-feature'].get('Remaining balance'),
-            details['home-feature'].get('Total')
-        ]
-        _df = pd.DataFrame([record], columns=columns)
-        df = pd.concat([df, _df], ignore_index=True)
-        df.to_csv(CSV_FILE, index=False)
+    # Parse cached pages across all cores; the event loop is the only CSV writer
+    write_header = not CSV_FILE.exists() or CSV_FILE.stat().st_size == 0
+    with CSV_FILE.open('a', newline='', encoding='utf-8') as csv_f, SEEN_FILE.open('a', encoding='utf-8') as seen_f:
+        if write_header:
+            csv.writer(csv_f, lineterminator='\n').writerow(columns)
+        await parse_cached_listings(home_urls, csv_f, seen_f)
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,6 +1,64 @@
 from scrape import *
 
 def test_get_maxpageid():
-    with open('test_data/test_pageid.html', 'r', encoding='utf-8') as f:
+    with open('test_data/test_pageid.html', 'rb') as f:
         html = f.read()
-    assert get_maxpageid(html) == 125  # Replace 5 with the expected value 
\ No newline at end of file
+    assert get_maxpageid(html) == 125  # Replace 5 with the expected value 
+
+def test_find_listing_links():
+    with open('test_data/test_pageid.html', 'rb') as f:
+        html = f.read()
+    links = find_listing_links(html)
+    assert len(links) == 30
+    assert links[0] == '/listing/405-ABBEY-RD-PEACHTREE-CITY-GA-30269/273635'
+
+def test_parse_details():
+    with open('test_data/test_listing.html', 'rb') as f:
+        tree = LexborHTMLParser(f.read())
+    assert parse_details(tree, 'loan-feature') == {
+        'Loan Type': 'FHA',
+        'Rate': '3.25%',
+        'Remaining balance': '$213,119',
+    }
+    assert parse_details(tree, 'home-feature') == {
+        'Principal & interest': '$1,105',
+        'Total': '$1,599',
+    }
+
+def test_parse_one():
+    with open('test_data/test_listing.html', 'rb') as f:
+        data = f.read()
+    expected = (
+        True, False, False, 'Atlanta',
+        'https://www.withroam.com/listing/3481-LAKESIDE-DR-NE-2204-ATLANTA-GA-30326/284986',
+        '3481 Lakeside Dr NE # 2204, Atlanta, GA 30326', 1, 1, 750,
+        '$265,000', '$51,880', 'FHA', '3.25%', '$213,119', '$1,599'
+    )
+    assert parse_one(data) == expected
+    assert parse_one(gzip.compress(data)) == expected
+
+def test_get_financials():
+    with open('test_data/test_listing.html', 'rb') as f:
+        tree = LexborHTMLParser(f.read())
+    financials = get_financials(tree)
+    assert financials == {'Listing price': '$265,000', 'Your cash down payment': '$51,880'}
+
+def test_load_seen_urls_resets_sidecar_without_csv(tmp_path):
+    seen_file = tmp_path / 'scrape.seen'
+    csv_file = tmp_path / 'scrape.csv'
+    seen_file.write_text('https://www.withroam.com/listing/A/1\n', encoding='utf-8')
+    assert load_seen_urls(seen_file, csv_file) == set()
+    assert seen_file.read_text(encoding='utf-8') == ''
+
+    csv_file.write_text('url\nhttps://www.withroam.com/listing/B/2\n', encoding='utf-8')
+    seen_file.unlink()
+    assert load_seen_urls(seen_file, csv_file) == {'https://www.withroam.com/listing/B/2'}
+    assert load_seen_urls(seen_file, csv_file) == {'https://www.withroam.com/listing/B/2'}
+
+def test_write_batch_uses_unix_line_endings(tmp_path):
+    csv_file = tmp_path / 'scrape.csv'
+    seen_file = tmp_path / 'scrape.seen'
+    with csv_file.open('a', newline='', encoding='utf-8') as csv_f, seen_file.open('a', encoding='utf-8') as seen_f:
+        write_batch(csv_f, seen_f, [('https://www.withroam.com/listing/A/1', (False, 'Atlanta', '$1,599'))])
+    assert csv_file.read_bytes() == b'False,Atlanta,"$1,599"\n'
+    assert seen_file.read_text(encoding='utf-8') == 'https://www.withroam.com/listing/A/1\n'